@@ -5,6 +5,15 @@ Uses asyncio.to_thread and gather functions to poll multiple switches concurrent
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 import pyeapi
+from ptovnetlab.switch_record import SwitchRecord
+
+# Use uvloop's libuv-based event loop when it's available (it's an optional
+# extra); asyncio.run picks the policy up automatically
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
 
 
 def invoker(switchlist_in: list, uname_in: str, passwd_in: str,
@@ -63,13 +72,18 @@ async def main(switchlist_in2: list, uname_in2: str, passwd_in2: str,
             'all_configs_out2[0]' is the configuration of the first item in switchlist
             'all_configs_out2[0][0] is the 1st line of the 1st switch's configuration
     """
-    # Set the maximum number of worker-threads we're willing to use
+    # Set the maximum number of worker-threads we're willing to use.  The
+    # polling threads just wait on eAPI responses, so scale the pool with the
+    # fleet (capped at 256) rather than pinning it at a couple dozen
     loop = asyncio.get_running_loop()
-    loop.set_default_executor(ThreadPoolExecutor(max_workers=20))
-    # Initialize the lists we will eventually return
+    loop.set_default_executor(ThreadPoolExecutor(
+        max_workers=min(256, max(16, len(switchlist_in2)))))
+    # Initialize the lists we will eventually return.  [None] * n gives us
+    # n independent slots to assign into; multiplying a list-of-lists would
+    # have given us n references to one shared list
     switchcount2 = len(switchlist_in2)
-    sw_vals_out2 = [[]] * (switchcount2)
-    allconfigs_out2 = [[]] * (switchcount2)
+    sw_vals_out2 = [None] * (switchcount2)
+    allconfigs_out2 = [None] * (switchcount2)
     lldpngbrs_out2 = []
     tasks = []
 
@@ -80,8 +94,6 @@ async def main(switchlist_in2: list, uname_in2: str, passwd_in2: str,
         tasks.append(asyncio.create_task(coro))
 
     # Gather the data from all the EAPI polling threads
-
-    answers = [] * (switchcount2)
     answers = await asyncio.gather(*tasks)
     print('Finished polling switches.')
     print('')
@@ -93,9 +105,8 @@ async def main(switchlist_in2: list, uname_in2: str, passwd_in2: str,
     for val in answers:
         # Item [0] in each "answer" is the list of switch properties (switch_vals)
         sw_vals_out2[val[3]] = val[0]
-        # Item [0] in each "answer" is the list of LLDP neighbors for the switch
-        for i, entry in enumerate(val[1]):
-            lldpngbrs_out2.append(entry)
+        # Item [1] in each "answer" is the list of LLDP neighbors for the switch
+        lldpngbrs_out2.extend(val[1])
         allconfigs_out2[val[3]] = val[2]
     return sw_vals_out2, lldpngbrs_out2, allconfigs_out2
 
@@ -123,33 +134,38 @@ def get_sw_data(switch3: str, uname_in3: str, passwd_in3: str, sw_cntr3_in: int
         The switch's startup configuration
     """
 
-    # Clear any existing pyeapi.client.config
-    pyeapi.client.config.clear()
-    # Build the pyeapi.client.config object required for connecting to the switch
-    pyeapi.client.config.add_connection(switch3, host=switch3, transport='https',
-                                        username=uname_in3, password=passwd_in3)
-    # Connect to the switch
-    node = pyeapi.connect_to(switch3)
-    # Get JSON-formatted results of several 'show...' commands
-    eos_output = node.enable(("show version", "show lldp neighbors",
-                             "show lldp local-info"), format="json")
+    # Connect straight to the switch; building the connection directly keeps
+    # each polling thread off the module-global pyeapi config store (which the
+    # old clear()/add_connection() sequence mutated from every thread) and
+    # both eAPI requests below reuse this one HTTPS connection
+    node = pyeapi.connect(host=switch3, transport='https', username=uname_in3,
+                          password=passwd_in3, return_node=True)
+    # Get JSON-formatted results of several 'show...' commands.  run_commands
+    # sends the whole tuple as one eAPI request/round-trip, where enable()
+    # would issue each command separately
+    eos_output = node.run_commands(("show version", "show lldp neighbors",
+                                    "show lldp local-info"), encoding="json")
     # Pluck the specific bits out data we want from the "show" cmds' output
-    eos_output_model = eos_output[0]["result"]["modelName"]
-    eos_output_ver = eos_output[0]["result"]["version"]
-    eos_output_mac = eos_output[0]["result"]["systemMacAddress"]
-    eos_output_serial = eos_output[0]["result"]["serialNumber"]
-    eos_output_lldpname = eos_output[2]["result"]["systemName"]
-    # Create this_switch_data list to return (include empty indecesfor later)
-    this_sw_vals = ([switch3, eos_output_model, eos_output_ver, eos_output_mac,
-                    eos_output_serial, eos_output_lldpname, '', '', '', '', '', ''])
+    eos_output_model = eos_output[0]["modelName"]
+    eos_output_ver = eos_output[0]["version"]
+    eos_output_mac = eos_output[0]["systemMacAddress"]
+    eos_output_serial = eos_output[0]["serialNumber"]
+    eos_output_lldpname = eos_output[2]["systemName"]
+    # Create this_switch_data record to return (the lab-side fields get
+    # filled in later)
+    this_sw_vals = SwitchRecord(name=switch3, model=eos_output_model,
+                                eos_version=eos_output_ver,
+                                system_mac=eos_output_mac,
+                                serial_nbr=eos_output_serial,
+                                lldp_name=eos_output_lldpname)
     # Create this_sw_lldpnbrs list to return
-    this_sw_lldpnbrs = []
-    for value in eos_output[1]["result"]["lldpNeighbors"]:
-        this_sw_lldpnbrs.append([str(eos_output_lldpname), str(value["port"]),
-                                 str(value["neighborDevice"]),
-                                 str(value["neighborPort"])])
-    # Create this_sw_cfg list to return
-    this_sw_cfg = []
-    this_sw_cfg = node.startup_config.splitlines()
+    this_sw_lldpnbrs = [[str(eos_output_lldpname), str(value["port"]),
+                         str(value["neighborDevice"]), str(value["neighborPort"])]
+                        for value in eos_output[1]["lldpNeighbors"]]
+    # Create this_sw_cfg list to return.  The startup-config is only available
+    # with text encoding and eAPI won't mix encodings within one request, so
+    # this is the second (and final) round-trip to the switch
+    this_sw_cfg = node.run_commands("show startup-config",
+                                    encoding="text")[0]["output"].splitlines()
     print("Finished polling: " + switch3)
     return this_sw_vals, this_sw_lldpnbrs, this_sw_cfg, int(sw_cntr3_in)
@@ -4,11 +4,41 @@ Creates project and nodes on GNS3 server and then populates their configuration.
 
 import asyncio
 from io import BytesIO
+import re
 import tarfile
-import requests
 import aiohttp
 import docker
 
+# Use uvloop's libuv-based event loop when it's available (it's an optional
+# extra); asyncio.run picks the policy up automatically
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
+
+# Pulls the adapter number out of a (lowercased, already-normalized)
+# interface name like 'ethernet12/1'; compiled once for the link-build loop
+ETHERNET_NBR_RE = re.compile(r'ethernet(\d+)')
+
+
+def node_position(node_nbr: int) -> tuple[int, int]:
+    """Map a node's ordinal position to x/y coordinates on the project canvas
+
+    Nodes are laid out left-to-right in rows of nine, the same walk the
+    old serial creation loop performed.
+
+    Parameters
+    ----------
+    node_nbr : int
+        The node's position in the list of switches being emulated
+    """
+    row, col = divmod(node_nbr, 9)
+    nodex = (-825 if row == 0 else -800) + col * 150
+    nodey = -375 + row * 200
+    return nodex, nodey
+
 
 def invoker(servername_in: str, gns3_url_in: str, sw_vals_in: list,
             allconf_in: list, prj_id_in: str, connx_in: list):
@@ -30,20 +60,37 @@ def invoker(servername_in: str, gns3_url_in: str, sw_vals_in: list,
         List of connections we need to make between the GNS3 nodes we're creating
     """
 
-    # Manage an event loop for all of the work done by gns3_node_create_async
     print('')
     print('Creating cEOS nodes in GNS3 project and pushing startup configs to each.')
-    sw_vals_new = asyncio.run(gns3_nodes_create_async
-                              (servername_in, gns3_url_in, sw_vals_in, allconf_in,
-                               prj_id_in))
-    # Only AFTER gns3_node_create_async is done, do we start populating connections
-    lastwords = asyncio.run(gns3_connx_create_async(servername_in, gns3_url_in,
-                                                    sw_vals_new, connx_in, prj_id_in))
+
+    async def run_both_phases():
+        """Run node creation then link creation on one event loop.
+
+        A second asyncio.run would tear down and rebuild the whole loop
+        (and its connections) between the two phases for no benefit.  Both
+        phases share one ClientSession, whose connector keeps its
+        connections to the GNS3 server alive across the phase boundary."""
+        connector = aiohttp.TCPConnector(limit=64, keepalive_timeout=75,
+                                         ttl_dns_cache=300)
+        async with aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=30)) as session:
+            sw_vals_new = await gns3_nodes_create_async(servername_in,
+                                                        gns3_url_in, sw_vals_in,
+                                                        allconf_in, prj_id_in,
+                                                        session)
+            # Only AFTER the nodes exist do we start populating connections
+            return await gns3_connx_create_async(servername_in, gns3_url_in,
+                                                 sw_vals_new, connx_in,
+                                                 prj_id_in, session)
+
+    lastwords = asyncio.run(run_both_phases())
     return lastwords
 
 
 async def gns3_nodes_create_async(servername_in: str, gns3_url_in: str, sw_vals_in:
-                                  list, allconf_in: list, prj_id_in: str):
+                                  list, allconf_in: list, prj_id_in: str,
+                                  session: aiohttp.ClientSession):
     """Add nodes to the new GNS3 project and push a copy of the configuration files
     to their substrate docker containers.
 
@@ -57,87 +104,91 @@ async def gns3_nodes_create_async(servername_in: str, gns3_url_in: str, sw_vals_
         List of needed data about the switches to be emulated
     all_conf_in : list
         List-of-lists holding all of the switch's configurations
+    session : aiohttp.ClientSession
+        HTTP session (shared with the link-creation phase) for GNS3 calls
     """
     print('')
     print('Creating the nodes in the GNS3 project.')
-    async with aiohttp.ClientSession() as session:
-        # Set x/y coordinates for the first node on the project
-        nodex = -825
-        nodey = -375
-        # Create docker client for RESTful API
-        d_clnt = docker.DockerClient(base_url='tcp://'+servername_in+':2375')
-        # Initialize single string version of switch config from allconf_in
-        my_string_to_go = ''
-        tasks = []
-
-        # Loop through the switches and create them in the GNS3 project
-        for sw_val_ctr, sw_val in enumerate(sw_vals_in):
-            looped_template_id = requests.post(gns3_url_in + 'templates/' + sw_val[7] + '/duplicate', timeout=30).json()['template_id']
+    # Create docker client for RESTful API.  The low-level APIClient lets
+    # us address containers by id directly, so pushing a config doesn't
+    # need a containers.get() round-trip first
+    d_clnt = docker.APIClient(base_url='tcp://'+servername_in+':2375')
+    # Cap how many switches we provision at once so we don't swamp the
+    # GNS3 server with template/node churn
+    semaphore = asyncio.Semaphore(8)
+
+    async def create_one_node(sw_val_ctr: int, sw_val):
+        """Provision one switch's GNS3 node and push its startup-config.
+
+        All of the GNS3 calls ride the shared aiohttp session (one
+        keep-alive connection pool for every switch), so the per-switch
+        pipelines overlap without tying up worker threads."""
+        async with semaphore:
+            nodex, nodey = node_position(sw_val_ctr)
+            async with session.post(
+                    gns3_url_in + 'templates/' + sw_val.template_id +
+                    '/duplicate') as resp:
+                looped_template_id = (await resp.json())['template_id']
+            # The temporary template and (once created) the node are each
+            # hit several times, so build their URLs once
+            template_url = f'{gns3_url_in}templates/{looped_template_id}'
             # Put request to change the # of interfaces of the temporary template
-            requests.put(gns3_url_in + 'templates/' + looped_template_id,
-                         json={'adapters': int(sw_val[6])+1}, timeout=30)
+            async with session.put(
+                    template_url,
+                    json={'adapters': sw_val.ether_count + 1}) as resp:
+                await resp.read()
             # Request to instantiate a new node using the temporary template
-            newnodeoutput = requests.post(gns3_url_in + 'projects/' + prj_id_in +
-                                          '/templates/' + looped_template_id, timeout=30,
-                                          json={'x': nodex, 'y': nodey})
-            # Capture the GNS3 node_id of the virtual-switch we just created
-            sw_val[8] = newnodeoutput.json()['node_id']
+            async with session.post(
+                    gns3_url_in + 'projects/' + prj_id_in + '/templates/' +
+                    looped_template_id,
+                    json={'x': nodex, 'y': nodey}) as resp:
+                # Capture the GNS3 node_id of the virtual-switch we just created
+                sw_val.node_id = (await resp.json())['node_id']
+            node_url = (f'{gns3_url_in}projects/{prj_id_in}/nodes/'
+                        f'{sw_val.node_id}')
             # Request to delete the temporary template
-            requests.delete(gns3_url_in + 'templates/' + looped_template_id, timeout=30)
-
+            async with session.delete(template_url) as resp:
+                await resp.read()
             # Change the name of the GNS3 node that we just created
-            requests.put(gns3_url_in + 'projects/' + prj_id_in + '/nodes/' + sw_val[8],
-                         timeout=30, json={'name': sw_val[0]})
-            # Capture the docker_id of the virtual-switch we just created  (container
-            # re-spawned when we changed its name)
-            sw_val[9] = requests.get(gns3_url_in + 'projects/' + prj_id_in + '/nodes/' +
-                                     sw_val[8], timeout=30).json()['properties']['container_id']
-            # Copy the modified sw_val objects contents back into sw_vals_in[sw_val_ctr]
-            sw_vals_in[sw_val_ctr] = sw_val
-            # Increment x/y coordinates for the *next* switch to be instantiated
-            nodex += 150
-            if nodex > 400:
-                nodex = -800
-                nodey = nodey + 200
+            async with session.put(node_url,
+                                   json={'name': sw_val.name}) as resp:
+                await resp.read()
+            # Capture the docker_id of the virtual-switch we just created
+            # (container re-spawned when we changed its name)
+            async with session.get(node_url) as resp:
+                sw_val.docker_id = (await resp.json())['properties']['container_id']
             # Tell GNS3 to start the node that represents the current switch
-            requests.post(gns3_url_in + 'projects/' + prj_id_in + '/nodes/' + sw_val[8]
-                          + '/start', timeout=30)
-            # Rebuild the switch-config from its current state as a list of individual
-            # lines to a single string with newline characters.
-            my_string_to_go = ''
-            for i in allconf_in[sw_val_ctr]:
-                my_string_to_go = my_string_to_go + i + "\n"
-            # Apply ASCII encoding to the config string
-            ascii_to_go = my_string_to_go.encode('ascii')
-            # Turn the ASCII-encoded string into a bytes-like object
-            bytes_to_go = BytesIO(ascii_to_go)
-            # file_like_to_go = StringIO(my_string_to_go)
-            # Turn the switch-config string into a tar archive for later
+            async with session.post(node_url + '/start') as resp:
+                await resp.read()
+            # Rebuild the switch-config as one newline-terminated ASCII
+            # byte string and tar it up for the trip to the container
+            config_bytes = ("\n".join(allconf_in[sw_val_ctr]) + "\n").encode('ascii')
             fh = BytesIO()
             with tarfile.open(fileobj=fh, mode='w') as tarch:
                 info = tarfile.TarInfo('startup-config')
-                info.size = len(my_string_to_go)
-                tarch.addfile(info, bytes_to_go)
-            # Get a docker API connection for the current switch's container
-            cont1 = d_clnt.containers.get(sw_val[9])
-            # Retrieve our tar archive from the file-like object ('fh') that we stored it in
+                info.size = len(config_bytes)
+                tarch.addfile(info, BytesIO(config_bytes))
+            # Retrieve our tar archive from the file-like object ('fh') that
+            # we stored it in
             uggo = fh.getbuffer()
-            # Put the startup-config onto / on the virtual-switch
-            cont1.put_archive('/', data=uggo)
-            # Move the startup-config from / to /mnt/flash on the virtual switch
-            cont1.exec_run('mv /startup-config /mnt/flash/')
-            # Set URL for request to GNS3 to stop the node
-            url = gns3_url_in+"projects/" + prj_id_in+"/nodes/" + sw_val[8] + "/stop"
-            # Assign the HTTP post request for async execution
-            tasks.append(asyncio.ensure_future(gns3_post(session, url, 'post')))
-            await asyncio.sleep(0.2)
-        await asyncio.gather(*tasks)
-        switch_vals_out = sw_vals_in
-        return switch_vals_out
+            # Put the startup-config directly into /mnt/flash on the
+            # virtual-switch; the container id we captured above addresses
+            # it, so no containers.get() and no follow-up 'mv' exec needed
+            await asyncio.to_thread(d_clnt.put_archive, sw_val.docker_id,
+                                    '/mnt/flash', uggo)
+            # Tell GNS3 to stop the node
+            await gns3_post(session, node_url + '/stop', 'post')
+
+    # Provision all of the switches concurrently (the semaphore keeps the
+    # fan-out polite)
+    await asyncio.gather(*(create_one_node(sw_val_ctr, sw_val)
+                           for sw_val_ctr, sw_val in enumerate(sw_vals_in)))
+    return sw_vals_in
 
 
 async def gns3_connx_create_async(servername_in: str, gns3_url_in: str, sw_vals_new:
-                                  list, connx_in: list, prj_id_in: str):
+                                  list, connx_in: list, prj_id_in: str,
+                                  session: aiohttp.ClientSession):
     """Add nodes to the new GNS3 project and push a copy of the configuration files
     to their substrate docker containers.
 
@@ -152,49 +203,48 @@ async def gns3_connx_create_async(servername_in: str, gns3_url_in: str, sw_vals_
         added by the gns3_nodes_create function.
     connx_in : list
         List of node-to-node connections that we want to create in the GNS3 project
+    session : aiohttp.ClientSession
+        HTTP session (shared with the node-creation phase) for GNS3 calls
     """
 
-    async with aiohttp.ClientSession() as sesh2:
-        # Loop through connections_to_make and make the connections between switches
-        print("Instantiating the connections between switches in the GNS3 \
-              project (might take a minute):")
-        cnx_urls = []
-        cnx_json = []
-        for n, val in enumerate(connx_in):
-            a_node_id = []
-            b_node_id = []
-            for m, val2 in enumerate(sw_vals_new):
-                if val[0] == val2[5]:
-                    a_node_id = val2[8]
-                if val[2] == val2[5]:
-                    b_node_id = val2[8]
-            a_node_adapter_nbr = str(val[1].split('/')[0].split('ethernet')[1])
-            b_node_adapter_nbr = str(val[3].split('/')[0].split('ethernet')[1])
-            # Make a list of URLs for the requests to create all the links
-            cnx_urls.append('')
-            cnx_urls[n] = gns3_url_in + 'projects/' + prj_id_in + '/links'
-            cnx_json.append({})
-            cnx_json[n] = {'nodes': [{'adapter_number': int(a_node_adapter_nbr),
-                                      'node_id': a_node_id, 'port_number': 0},
-                                     {'adapter_number': int(b_node_adapter_nbr),
-                                      'node_id': b_node_id, 'port_number': 0}]}
-        # Assign the HTTP post request for async execution
-        tasks_2 = []
-        for n, url in enumerate(cnx_urls):
-            tasks_2.append(asyncio.ensure_future(gns3_post(sesh2, str(url),
-                           'post', jsondata=cnx_json[n])))
-            await asyncio.sleep(0.2)
-        responses = await asyncio.gather(*tasks_2)
-        return responses
-
-
-async def gns3_post(session_in: str, url_in: str, method: str, **kwargs) -> str:
-    """Send an async POST request to GNS3 server.
+    # Loop through connections_to_make and make the connections between switches
+    print("Instantiating the connections between switches in the GNS3 \
+          project (might take a minute):")
+    # Map each switch's LLDP name to its GNS3 node-id once, rather than
+    # re-scanning sw_vals_new for both ends of every connection
+    node_id_by_lldp = {sw_val.lldp_name: sw_val.node_id for sw_val in sw_vals_new}
+    # Every link posts to the same endpoint; build the payloads in one
+    # comprehension off the lookup dict
+    links_url = gns3_url_in + 'projects/' + prj_id_in + '/links'
+    cnx_payloads = [
+        {'nodes': [{'adapter_number': int(ETHERNET_NBR_RE.match(val[1]).group(1)),
+                    'node_id': node_id_by_lldp[val[0]], 'port_number': 0},
+                   {'adapter_number': int(ETHERNET_NBR_RE.match(val[3]).group(1)),
+                    'node_id': node_id_by_lldp[val[2]], 'port_number': 0}]}
+        for val in connx_in]
+    # Fire all of the link-creation POSTs concurrently; each is just an
+    # HTTP round-trip, so overlapping them collapses the "might take a
+    # minute" phase down to a few round-trip times.  The semaphore caps
+    # how many are in flight at once so we don't swamp the GNS3 server.
+    cnx_semaphore = asyncio.Semaphore(32)
+
+    async def make_link(payload: dict):
+        async with cnx_semaphore:
+            return await gns3_post(session, links_url, 'post', jsondata=payload)
+
+    responses = await asyncio.gather(*(make_link(payload)
+                                       for payload in cnx_payloads))
+    return responses
+
+
+async def gns3_post(session_in: aiohttp.ClientSession, url_in: str, method: str,
+                    **kwargs) -> bytes:
+    """Send an async HTTP request to GNS3 server.
 
     Parameters
     ----------
-    session_in : str
-        The name of the aiohttp.ClientSession object used for the connections
+    session_in : aiohttp.ClientSession
+        The aiohttp.ClientSession object used for the connections
     url_in : str
         The URL to be posted to the GNS3 server (includes project ID and node ID)
     method : str
@@ -203,27 +253,9 @@ async def gns3_post(session_in: str, url_in: str, method: str, **kwargs) -> str:
         Optional.  Any JSON to be included with the HTTP request
     """
 
-    if 'jsondata' in kwargs:
-        jsondata = kwargs['jsondata']
-    if method == 'post':
-        if 'jsondata' in kwargs:
-            async with session_in.post(url_in, json=jsondata) as response:
-                await asyncio.sleep(.2)
-        else:
-            async with session_in.post(url_in) as response:
-                await asyncio.sleep(.2)
-    if method == 'get':
-        if 'jsondata' in kwargs:
-            async with session_in.get(url_in, json=jsondata) as response:
-                await asyncio.sleep(.2)
-        else:
-            async with session_in.get(url_in) as response:
-                await asyncio.sleep(.2)
-    if method == 'put':
-        if jsondata:
-            async with session_in.put(url_in, json=kwargs['jsondata']) as response:
-                await asyncio.sleep(.2)
-        else:
-            async with session_in.put(url_in) as response:
-                await asyncio.sleep(.2)
-    return response
+    # One session.request call covers every method/payload combination; the
+    # body is read before the context manager exits so the connection goes
+    # straight back to the keep-alive pool
+    async with session_in.request(method.upper(), url_in,
+                                  json=kwargs.get('jsondata')) as response:
+        return await response.read()
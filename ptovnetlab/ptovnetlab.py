@@ -5,10 +5,10 @@ Entry-point module for package.  Gathers and parses run-state details
  lab project in which the interrogated devices are emulated."""
 
 
-import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from getpass import getpass
-import requests
-from ptovnetlab import arista_poller, arista_sanitizer, gns3_worker
+from pathlib import Path
 
 
 def read_file(file_to_read: str) -> list:
@@ -24,39 +24,9 @@ def read_file(file_to_read: str) -> list:
     list of lines : list
         The contents of the file as a list of strings
     """
-    # Open the file in read mode
-    opened_file = open(file_to_read, "r")
-    # Each line of the file into an entry in a list called list_of_lines
-    list_of_lines = opened_file.read().splitlines()
-    # Close the file that was being read
-    opened_file.close()
-    return list_of_lines
-
-
-def list_search(list_to_search: list, item_to_find: str) -> bool:
-    """Search a list for a specified string
-
-    Parameters
-    ----------
-    list_to_search : list
-        The list to be searched
-    item_to_find : str
-        The item to search for
-    """
-    for val in list_to_search:
-        if val == item_to_find:
-            return True
-    return False
-
-
-def predelimiter(string, delimiter):
-  """Returns the section of a string before the first instance of a delimiter."""
-
-  index = string.find(delimiter)
-  if index == -1:
-    return string  # Delimiter not found, return the whole string
-  else:
-    return string[:index]
+    # Read the whole file in one call; read_text opens, reads, and closes
+    # the handle for us
+    return Path(file_to_read).read_text().splitlines()
 
 
 def p_to_v(**kwargs):
@@ -81,19 +51,15 @@ def p_to_v(**kwargs):
     -------
     result : str
     """
-    # Guide for which values are held in which indices of switch_vals
-    # switch_vals[n][0]= switch name received as input argument
-    # switch_vals[n][1]= switch model
-    # switch_vals[n][2]= EOS version
-    # switch_vals[n][3]= system MAC
-    # switch_vals[n][4]= serial number
-    # switch_vals[n][5]= LLDP system-name
-    # switch_vals[n][6]= Number of Ethernet interfaces
-    # switch_vals[n][7]= GNS3 image-template ID
-    # switch_vals[n][8]= GNS3 node-ID
-    # switch_vals[n][9]= Docker container ID
-    # switch_vals[n][10]= switch vendor/platform
-    # switch_vals[n][11]= QEMU VM ID
+    # Import the heavyweight dependencies (urllib3, pyeapi, docker, aiohttp)
+    # only once we're actually going to do the work, so --help and bad
+    # arguments don't pay their startup cost
+    import requests
+    from requests.adapters import HTTPAdapter
+    from ptovnetlab import arista_poller, arista_sanitizer, gns3_worker
+
+    # switch_vals is a list of SwitchRecord instances, one per switch
+    # (see ptovnetlab/switch_record.py for the field definitions)
 
     # Initializing list of LLDP neighbor details we'll use to build a list of connections for GNS3
     connections_to_make = []
@@ -101,9 +67,6 @@ def p_to_v(**kwargs):
     # Initializing nested list for holding the configs of ALL the switches
     allconfigs = []
 
-    # Initializing a list for holding a list of gns3 template_id values and corresponding EOS \
-    # version values
-    image_map = []
     # Set default values for all anticipated arguments
     filename = ''
     username = ''
@@ -162,72 +125,78 @@ def p_to_v(**kwargs):
                                                                       username, passwd,
                                                                       run_type)
 
-    # Loop through all those configs and clean them up for life in a virtual lab,
-    # while also grabbing the interface count for later
-    for i, val in enumerate(allconfigs):
-        allconfigs[i], switch_vals[i][6] = arista_sanitizer.eos_to_ceos(val, switch_vals[i][3])
-
-    # Create a list of the LLDP local-IDs used by our switches
-    our_lldp_ids = []
-    for val in switch_vals:
-        our_lldp_ids.append(val[5])
-
-    # Sanitize connections_to_make list; removing any entries in which either end
-    # is NOT one of our switches  (we can't tell GNS3 to create a connection to a
-    # node that doesn't exist in the project.)
-    connections_to_make[:] = [connx for connx in connections_to_make if
-                              list_search(our_lldp_ids, connx[0]) and
-                              list_search(our_lldp_ids, connx[2])]
-
-    # Remove A|B-inverted entries in connections_to_make
-    # (connections are directionless; so A<>B is the same as B<>A)
-    for i in connections_to_make:
-        for j in connections_to_make:
-            if i[2]+i[3] == j[0]+j[1]:
-                connections_to_make.remove(j)
-
-    # Clean up "management1" in the connections_to_make list (using eth0
-    #  instead.  Prod Switch management1 interface is presented in cEOS CLI
-    #  as Management0, and Docker presents it to the container as eth0, which
-    # is how it presents in GNS3
-
-    for i, val in enumerate(connections_to_make):
-        connections_to_make[i][1] = val[1].lower()
-        connections_to_make[i][3] = val[3].lower()
-        if val[1].startswith('management'):
-            for j, val2 in enumerate(switch_vals):
-                if val[0] == val2[5]:
-                    connections_to_make[i][1] = 'ethernet0'
-        if val[3].startswith('management'):
-            for j, val2 in enumerate(switch_vals):
-                if val[2] == val2[5]:
-                    connections_to_make[i][3] = 'ethernet0'
-
     # Set GNS3 URL
-    gns3_url = 'http://'+servername+':3080/v2/'
-    gns3_url_noapi = 'http://'+servername+':3080/static/web-ui/server/1/project/'
-
-    # Get all of the docker image templates from the GNS3 server so we can figure out
-    # which template_id value maps to a specific EOS version when we start building
-    # our instances
-    r = requests.get(gns3_url + 'templates', timeout=20)
-    for x in r.json():
-        if x['template_type'] == 'docker':
-            image_map.append([x['template_id'], x['image']])
-
-    # Loop through image_map while looping through switch_vals, looking for imag_map
-    # names that are good matches for the EOS version data captured in switch_vals,
-    #  and appending each entry in switch_status with the GNS3 template_id from the
-    #  matching entry in image_map
-    for i in range(len(switch_vals)):
-        for j in range(len(image_map)):
-            # strip any trailing garbage from the EOS version reported by the switch API
-            fudgedupeosverion = ('ceos:' + predelimiter(switch_vals[i][2].lower(), '-'))
-            if fudgedupeosverion == image_map[j][1].lower():
-                switch_vals[i][7] = image_map[j][0]
+    gns3_url = f'http://{servername}:3080/v2/'
+    gns3_url_noapi = f'http://{servername}:3080/static/web-ui/server/1/project/'
+
+    # One pooled HTTP session for all of our GNS3 API calls; keep-alive lets
+    # each request reuse the same TCP connection to the server
+    gns3_session = requests.Session()
+    gns3_session.mount('http://', HTTPAdapter(pool_connections=16, pool_maxsize=64))
+
+    # Kick off the GNS3 templates fetch now so the HTTP round-trip overlaps
+    # the CPU-bound config sanitizing below
+    template_fetcher = ThreadPoolExecutor(max_workers=1)
+    templates_future = template_fetcher.submit(gns3_session.get,
+                                               gns3_url + 'templates', timeout=20)
+
+    # Clean up all those configs for life in a virtual lab, while also grabbing
+    # the interface count for later.  Each switch's sanitizing is independent,
+    # CPU-bound string work, so spread it across a process pool.
+    with ProcessPoolExecutor() as executor:
+        sanitized = executor.map(arista_sanitizer.eos_to_ceos, allconfigs,
+                                 [val.system_mac for val in switch_vals])
+        for i, (clean_config, ether_count) in enumerate(sanitized):
+            allconfigs[i] = clean_config
+            switch_vals[i].ether_count = ether_count
+
+    # Create a set of the LLDP local-IDs used by our switches
+    our_lldp_ids = {val.lldp_name for val in switch_vals}
+
+    # Filter, normalize, and dedup connections_to_make in a single pass:
+    #  - drop entries in which either end is NOT one of our switches (we
+    #    can't tell GNS3 to create a connection to a node that doesn't
+    #    exist in the project)
+    #  - lowercase the port names, rewriting management ports as ethernet0
+    #    (the prod switch's Management1 presents in the cEOS CLI as
+    #    Management0, which Docker/GNS3 expose as eth0), so the dedup key
+    #    below is canonical
+    #  - remove A|B-inverted duplicates (connections are directionless, so
+    #    A<>B is the same as B<>A); each connection becomes a frozenset of
+    #    its two endpoints and only the first occurrence is kept
+    seen_connx = set()
+    deduped_connx = []
+    for connx in connections_to_make:
+        if connx[0] not in our_lldp_ids or connx[2] not in our_lldp_ids:
+            continue
+        a_port = connx[1].lower()
+        b_port = connx[3].lower()
+        connx[1] = 'ethernet0' if a_port.startswith('management') else a_port
+        connx[3] = 'ethernet0' if b_port.startswith('management') else b_port
+        connx_key = frozenset(((connx[0], connx[1]), (connx[2], connx[3])))
+        if connx_key not in seen_connx:
+            seen_connx.add(connx_key)
+            deduped_connx.append(connx)
+    connections_to_make = deduped_connx
+
+    # Collect the docker image templates that the GNS3 server was asked for
+    # before sanitizing started, so we can figure out which template_id value
+    # maps to a specific EOS version when we start building our instances
+    r = templates_future.result()
+    template_fetcher.shutdown()
+    template_id_by_image = {x['image'].lower(): x['template_id']
+                            for x in r.json() if x['template_type'] == 'docker'}
+
+    # Match each switch's EOS version against the GNS3 image names, filling in
+    # each entry in switch_vals with the template_id of the matching image
+    for sw_val in switch_vals:
+        # strip any trailing garbage from the EOS version reported by the switch API
+        fudgedupeosverion = f"ceos:{sw_val.eos_version.lower().partition('-')[0]}"
+        if fudgedupeosverion in template_id_by_image:
+            sw_val.template_id = template_id_by_image[fudgedupeosverion]
     # create a new project with provided name and grab the project_id
-    gnsprj_id = requests.post(gns3_url + 'projects', json={'name': prj_name},
-                              timeout=20).json()['project_id']
+    gnsprj_id = gns3_session.post(gns3_url + 'projects', json={'name': prj_name},
+                                  timeout=20).json()['project_id']
     # Grab the templates object from the GNS server so we can crawl through it
     # templ_qry_resp = requests.get(gns3_url + 'templates')
 
@@ -236,23 +205,31 @@ def p_to_v(**kwargs):
                         allconfigs, gnsprj_id, connections_to_make)
     # Done!
 
-    # Close the GNS3 project
-    requests.post(gns3_url + 'projects' + 'project_id' + 'close')
-    return gns3_url_noapi + gnsprj_id
+    # Close the GNS3 project, then release the session's pooled connections
+    gns3_session.post(f'{gns3_url}projects/{gnsprj_id}/close', timeout=20)
+    gns3_session.close()
+    return f'{gns3_url_noapi}{gnsprj_id}'
+
+
+def make_parser() -> argparse.ArgumentParser:
+    """Build the argument parser shared by the script entry points
+    (running this module directly, or via ptovnetlab_cli.py)."""
+    parser = argparse.ArgumentParser(
+        description='Model production Arista switches as a GNS3 virtual lab.')
+    parser.add_argument('--filename', default='',
+                        help='File containing the list of switches to interrogate')
+    parser.add_argument('--switchlist', nargs='*', default=[],
+                        help='Names of the switches to interrogate')
+    parser.add_argument('--username', default='',
+                        help='Username for Arista EOS login')
+    parser.add_argument('--passwd', default='',
+                        help='Password for Arista EOS login')
+    parser.add_argument('--servername', default='',
+                        help='Name of the GNS3 server')
+    parser.add_argument('--prjname', default='',
+                        help='Name of the GNS3 project to create')
+    return parser
 
 
 if __name__ == '__main__':
-    kwdict = {}
-    for arg in sys.argv[1:]:
-        splarg = arg.split('=')
-        if splarg[0] == 'switchlist':
-            splargalt = []
-            for swname in splarg[1].split():
-                splargalt.append(swname)
-            kwdict[splarg[0]] = splargalt
-        else:
-            kwdict[splarg[0]] = splarg[1]
-    kwdict['runtype'] = 'script'
-    import ptovnetlab.gns3_worker
-    import ptovnetlab.arista_poller
-    p_to_v(**kwdict)
+    p_to_v(runtype='script', **vars(make_parser().parse_args()))
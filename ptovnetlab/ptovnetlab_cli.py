@@ -5,18 +5,8 @@ will run it from.  Then move the vnlOnDemandCli.py file *up* one level, so that
 
 
 import ptovnetlab.ptovnetlab as ptovnetlab
-import sys
 
 if __name__ == '__main__':
-    kwdict = {}
-    for arg in sys.argv[1:]:
-        splarg = arg.split('=')
-        if splarg[0] == 'switchlist':
-            splargalt = []
-            for swname in splarg[1].split():
-                splargalt.append(swname)
-            kwdict[splarg[0]] = splargalt
-        else:
-            kwdict[splarg[0]] = splarg[1]
-    kwdict['runtype'] = 'script'
-    ptovnetlab.p_to_v(**kwdict)
+    # One parser serves both this wrapper and 'python -m ptovnetlab.ptovnetlab'
+    args = ptovnetlab.make_parser().parse_args()
+    ptovnetlab.p_to_v(runtype='script', **vars(args))
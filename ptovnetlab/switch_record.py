@@ -0,0 +1,29 @@
+"""switch_record.py
+
+Record type shared by the polling, sanitizing, and GNS3 modules to
+ describe one production switch and its virtual-lab counterpart."""
+
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class SwitchRecord:
+    """Everything we need to know about one switch being emulated.
+
+    The first six fields are filled in from the switch's own eAPI
+     responses; the remainder are filled in while the GNS3 lab is
+     being built.
+    """
+
+    name: str = ''
+    model: str = ''
+    eos_version: str = ''
+    system_mac: str = ''
+    serial_nbr: str = ''
+    lldp_name: str = ''
+    ether_count: int = 0
+    template_id: str = ''
+    node_id: str = ''
+    docker_id: str = ''
+    platform: str = ''
+    vm_id: str = ''